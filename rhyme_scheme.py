@@ -0,0 +1,196 @@
+import re
+import sys
+from collections import Counter
+from multiprocessing import Pool
+
+from rhymer import Rhymer
+
+# Streaming rhyme-scheme analysis for large text corpora.
+# Lines are read one at a time and each line-final word is mapped to a rhyme class id through the precomputed
+# table returned by Rhymer.rhyme_class_table().
+# Stanzas of up to MAX_STANZA_LINES lines get a scheme for the whole stanza. Longer stanzas (e.g. lyrics without
+# blank lines) are labelled in consecutive windows of SCHEME_WINDOW lines (quatrains), and a trailing partial window
+# only counts towards the line and rhyme family counts. Every scheme is therefore at most MAX_STANZA_LINES letters
+# long, so both the lines held in memory and the set of possible schemes are fixed, whatever the size of the corpus.
+
+WORD_PATTERN = re.compile(r"[A-Za-z']+")
+UNKNOWN = -1  # Class id for line-end words that are not in the table
+UNKNOWN_LETTER = '?'  # Scheme letter for lines whose rhyme class is unknown
+MAX_STANZA_LINES = 6  # Longest stanza labelled with a scheme for the whole stanza
+SCHEME_WINDOW = 4  # Number of lines per scheme when longer stanzas are labelled in windows
+
+_worker_word_classes = None  # Table shared with worker processes by _init_worker
+
+
+def line_end_words(lines):
+    # Yield the final word of each line in upper case, None for blank lines (stanza breaks)
+    # and an empty string for non-blank lines without any word
+    for line in lines:
+        if not line.strip():
+            yield None
+            continue
+        words = WORD_PATTERN.findall(line)
+        yield words[-1].upper() if words else ''
+
+
+def lookup_rhyme_class(word, word_classes):
+    # Get the rhyme class id of a word, retrying without surrounding apostrophes (e.g. "singin'")
+    class_id = word_classes.get(word)
+    if class_id is None:
+        class_id = word_classes.get(word.strip("'"), UNKNOWN)
+    return class_id
+
+
+def rhyme_class_ids(words, word_classes):
+    # Yield the rhyme class id of each line-end word, passing stanza breaks (None) through
+    for word in words:
+        yield None if word is None else lookup_rhyme_class(word, word_classes)
+
+
+def stanzas(class_ids, max_lines=MAX_STANZA_LINES, window=SCHEME_WINDOW):
+    # Group class ids into stanzas separated by breaks, yielding (chunk, continued) pairs
+    # Stanzas longer than max_lines are split into chunks of window lines, and every chunk after the first
+    # is marked as continued so the stanza is still only counted once
+    window = min(window, max_lines)
+    stanza = []
+    continued = False
+    for class_id in class_ids:
+        if class_id is None:
+            if stanza:
+                yield stanza, continued
+                stanza = []
+            continued = False
+            continue
+        stanza.append(class_id)
+        if len(stanza) > max_lines or (continued and len(stanza) >= window):
+            while len(stanza) >= window:
+                yield stanza[:window], continued
+                stanza = stanza[window:]
+                continued = True
+    if stanza:
+        yield stanza, continued
+
+
+def scheme_letter(index):
+    # Convert a 0-based index to a scheme letter (A, B, ..., Z, AA, AB, ...)
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def scheme_label(stanza):
+    # Label a stanza of class ids with letters in order of first appearance (e.g. [7, 3, 7, 3] -> "ABAB")
+    letters = {}
+    label = []
+    for class_id in stanza:
+        if class_id == UNKNOWN:
+            label.append(UNKNOWN_LETTER)
+            continue
+        if class_id not in letters:
+            letters[class_id] = scheme_letter(len(letters))
+        label.append(letters[class_id])
+    return ''.join(label)
+
+
+def labelled_stanzas(lines, word_classes, max_stanza_lines=MAX_STANZA_LINES):
+    # Stream (scheme, chunk, continued) triples for the stanzas in the lines
+    # The scheme is None for the trailing partial window of a long stanza, which is too short to label
+    window = min(SCHEME_WINDOW, max_stanza_lines)
+    for stanza, continued in stanzas(rhyme_class_ids(line_end_words(lines), word_classes), max_stanza_lines):
+        if continued and len(stanza) < window:
+            yield None, stanza, continued
+        else:
+            yield scheme_label(stanza), stanza, continued
+
+
+def rhyme_schemes(lines, word_classes, max_stanza_lines=MAX_STANZA_LINES):
+    # Stream the rhyme scheme of each stanza, or of each window of the stanzas that are labelled in windows
+    for scheme, _, _ in labelled_stanzas(lines, word_classes, max_stanza_lines):
+        if scheme is not None:
+            yield scheme
+
+
+def empty_result():
+    # Create an empty analysis result
+    return {'lines': 0, 'unknown': 0, 'stanzas': 0, 'schemes': Counter(), 'families': Counter()}
+
+
+def analyze_lines(lines, word_classes, max_stanza_lines=MAX_STANZA_LINES):
+    # Count lines, unknown line-end words, stanzas, rhyme schemes and rhyme families (by class id) in the lines
+    result = empty_result()
+    for scheme, stanza, continued in labelled_stanzas(lines, word_classes, max_stanza_lines):
+        if not continued:
+            result['stanzas'] += 1
+        if scheme is not None:
+            result['schemes'][scheme] += 1
+        result['lines'] += len(stanza)
+        for class_id in stanza:
+            if class_id == UNKNOWN:
+                result['unknown'] += 1
+            else:
+                result['families'][class_id] += 1
+    return result
+
+
+def analyze_file(path, word_classes, max_stanza_lines=MAX_STANZA_LINES, encoding='utf-8'):
+    # Analyze a single text file, reading it line by line
+    with open(path, 'r', encoding=encoding, errors='replace') as file:
+        return analyze_lines(file, word_classes, max_stanza_lines)
+
+
+def merge_results(results):
+    # Merge analysis results (e.g. from several file shards) into one
+    merged = empty_result()
+    for result in results:
+        for key in ('lines', 'unknown', 'stanzas'):
+            merged[key] += result[key]
+        merged['schemes'].update(result['schemes'])
+        merged['families'].update(result['families'])
+    return merged
+
+
+def _init_worker(word_classes):
+    # Store the rhyme class table once per worker process instead of sending it with every shard
+    global _worker_word_classes
+    _worker_word_classes = word_classes
+
+
+def _analyze_shard(shard):
+    # Analyze one file shard in a worker process
+    path, max_stanza_lines, encoding = shard
+    return analyze_file(path, _worker_word_classes, max_stanza_lines, encoding)
+
+
+def analyze_files(paths, word_classes, processes=None, max_stanza_lines=MAX_STANZA_LINES, encoding='utf-8'):
+    # Analyze file shards in parallel worker processes (or in this process if processes == 1) and merge the results
+    if processes == 1:
+        return merge_results(analyze_file(path, word_classes, max_stanza_lines, encoding) for path in paths)
+    shards = [(path, max_stanza_lines, encoding) for path in paths]
+    with Pool(processes, initializer=_init_worker, initargs=(word_classes,)) as pool:
+        return merge_results(pool.imap_unordered(_analyze_shard, shards))
+
+
+def rhyme_families(result, class_tails, n=None):
+    # Get the n most common rhyme families in a result as (rhyme tail, count) pairs
+    return [(' '.join(class_tails[class_id]), count) for class_id, count in result['families'].most_common(n)]
+
+
+def main(paths):
+    # Analyze the given file shards with the CMU Pronunciation Dictionary and print the most common schemes and families
+    r = Rhymer('cmudict-0.7b', 'cmudict-0.7b.phones')
+    word_classes, class_tails = r.rhyme_class_table()
+    result = analyze_files(paths, word_classes)
+    print(f"Lines: {result['lines']}, Stanzas: {result['stanzas']}, Unknown line-end words: {result['unknown']}")
+    print("Most common rhyme schemes:")
+    for scheme, count in result['schemes'].most_common(20):
+        print(f"  {scheme}: {count}")
+    print("Most common rhyme families:")
+    for tail, count in rhyme_families(result, class_tails, 20):
+        print(f"  {tail}: {count}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
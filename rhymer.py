@@ -1,45 +1,70 @@
+import random
 import re
+from collections import Counter
+
+
+def stress_pattern(key):
+    # Get the stress digits of the vowels in a phoneme sequence in key order (e.g. ('IH0', 'NG') -> "0")
+    return ''.join(re.sub(r'[^0-9]+', '', phoneme) for phoneme in key)
+
+
+def _base_word(word):
+    # Strip the (n) suffix of an alternate pronunciation (e.g. READING(1) -> READING)
+    return re.sub(r'\([0-9]+\)$', '', word)
 
 
 class PhonemeTrie:
     # Trie data structure for storing the phoneme sequences of words
 
-    def __init__(self):
+    def __init__(self, track_stress=False):
         # Initialize the trie with an empty list of words and dictionary of children
         self.children = {}
         self.words = []
+        # Subtree aggregates, kept up to date on every insert and delete
+        self.subtree_words = 0  # Number of words stored in this node and all of its descendants
+        self.subtree_depth = 0  # Longest key length below this node that leads to a word
+        self.track_stress = track_stress
+        self.subtree_stress = Counter() if track_stress else None  # Stress pattern histogram of the subtree
 
     def __setitem__(self, key, value):
         # Traverse the trie recursively (DFS) to the node corresponding to the key and set the value
+        # The subtree aggregates are updated on the way down, so inserting needs a single pass
+        pattern = stress_pattern(key) if self.track_stress else None
+        remaining = len(key)
         node = self
         for head in key:
-            if head not in node.children:
-                node.children[head] = PhonemeTrie()
-            node = node.children[head]
+            node.subtree_words += 1
+            if node.subtree_depth < remaining:
+                node.subtree_depth = remaining
+            if pattern is not None:
+                node.subtree_stress[pattern] += 1
+            child = node.children.get(head)
+            if child is None:
+                child = node.children[head] = PhonemeTrie(self.track_stress)
+            node = child
+            remaining -= 1
+        node.subtree_words += 1
+        if pattern is not None:
+            node.subtree_stress[pattern] += 1
         node.words.append(value)  # Add the key word to the final node
 
     def __getitem__(self, key):
         # Traverse the trie recursively (DFS) to the node corresponding to the key and return the value
-        node = self
-        for head in key:
-            if head not in node.children:
-                raise KeyError(key)
-            node = node.children[head]
-        if node.words:
+        node = self.node(key)
+        if node is not None and node.words:
             return node.words
         else:
             raise KeyError(key)
 
     def __delitem__(self, key, value):
         # Traverse the trie recursively (DFS) to the node corresponding to the key and remove the value
-        node = self
-        for head in key:
-            if head in node.children:
-                node = node.children[head]
-            else:
-                raise KeyError(key)
+        path = self._path(key)
+        if path is None:
+            raise KeyError(key)
+        node = path[-1]
         if value in node.words:
             node.words.remove(value)
+            self._update_path(path, key, -1)
         else:
             raise ValueError(key)
 
@@ -52,11 +77,8 @@ class PhonemeTrie:
         return True
 
     def __len__(self):
-        # Count the number of words in the trie
-        n = len(self.words)
-        for child in self.children.values():
-            n += len(child)
-        return n
+        # Count the number of words in the trie (kept as a subtree aggregate, so no traversal is needed)
+        return self.subtree_words
 
     def get(self, key, default=None):
         # Get the value for the key if it exists or return the default value
@@ -97,59 +119,133 @@ class PhonemeTrie:
 
     def __add__(self, other):
         # + function to combine the two tries (Union)
-        result = PhonemeTrie()
+        result = PhonemeTrie(self.track_stress)
         result += self
         result += other
         return result
 
     def __sub__(self, other):
         # - function to remove elements in one tree from another (Subtraction)
-        result = PhonemeTrie()
+        result = PhonemeTrie(self.track_stress)
         result += self
         result -= other
         return result
 
     def __iadd__(self, other):
         # + function to combine the two tries (Union)
-        def add_words(node, phoneme_sequence, words):
-            # Base case: If phoneme_sequence is empty, merge the specified words and remove duplicates
-            if not phoneme_sequence:
-                node.words = list(set(node.words + words))
-                return
-            # Recursive case: Navigate to or create the next node in the sequence
-            head = phoneme_sequence[0]
-            if head not in node.children:
-                node.children[head] = PhonemeTrie()
-            add_words(node.children[head], phoneme_sequence[1:], words)
-
-        # Iterate through all keys and words in the other trie and add them
+        # Iterate through all keys and words in the other trie, merge them into the final node and remove duplicates
         for ps, ws in other.keys():
-            add_words(self, ps, ws)
+            path = self._path(ps, create=True)
+            node = path[-1]
+            before = len(node.words)
+            node.words = list(set(node.words + ws))
+            self._update_path(path, ps, len(node.words) - before)
         return self
 
     def __isub__(self, other):
         # - function to remove elements in one tree from another (Subtraction)
-        def remove_words(node, phoneme_sequence, words):
-            # Base case: If phoneme_sequence is empty, remove the specified words and return whether the node is empty
-            if not phoneme_sequence:
-                for word in words:
-                    if word in node.words:
-                        node.words.remove(word)
-                return not node.words and not node.children
-            # Recursive case: Navigate to the next node in the sequence
-            head = phoneme_sequence[0]
-            if head in node.children:
-                child_empty = remove_words(node.children[head], phoneme_sequence[1:], words)
-                if child_empty:
-                    del node.children[head]
-                return not node.words and not node.children  # Check if this node is now empty (no words or children)
-            return False  # Phoneme sequence not found, no change
-
         # Iterate through all keys and words in the other trie and remove them
         for ps, ws in other.keys():
-            remove_words(self, ps, ws)
+            path = self._path(ps)
+            if path is None:
+                continue  # Phoneme sequence not found, no change
+            node = path[-1]
+            before = len(node.words)
+            for word in ws:
+                if word in node.words:
+                    node.words.remove(word)
+            # Remove nodes left without words or children, from the bottom up
+            for i in range(len(ps), 0, -1):
+                if path[i].words or path[i].children:
+                    break
+                del path[i - 1].children[ps[i - 1]]
+            self._update_path(path, ps, len(node.words) - before)
         return self
 
+    def node(self, prefix):
+        # Get the node corresponding to the prefix, or None if the prefix is not in the trie
+        node = self
+        for head in prefix:
+            node = node.children.get(head)
+            if node is None:
+                return None
+        return node
+
+    def _path(self, key, create=False):
+        # Get the list of nodes from this node to the node corresponding to the key, creating missing nodes if requested
+        path = [self]
+        node = self
+        for head in key:
+            if head not in node.children:
+                if not create:
+                    return None
+                node.children[head] = PhonemeTrie(self.track_stress)
+            node = node.children[head]
+            path.append(node)
+        return path
+
+    def _update_path(self, path, key, delta):
+        # Update the subtree aggregates of every node on the path after delta words were added (or removed) at the key
+        if not delta:
+            return
+        pattern = stress_pattern(key) if self.track_stress else None
+        for node in path:
+            node.subtree_words += delta
+            if pattern is not None:
+                node.subtree_stress[pattern] += delta
+                if node.subtree_stress[pattern] <= 0:
+                    del node.subtree_stress[pattern]
+        if delta > 0:
+            for i, node in enumerate(path):
+                node.subtree_depth = max(node.subtree_depth, len(key) - i)
+        else:
+            # Removing words can only shorten the depth along the path, so recompute it from the bottom up
+            for node in reversed(path):
+                node.subtree_depth = max([child.subtree_depth + 1 for child in node.children.values()
+                                          if child.subtree_words] + [0])
+
+    def prefix_count(self, prefix=()):
+        # Count the words whose key starts with the prefix
+        node = self.node(prefix)
+        return node.subtree_words if node is not None else 0
+
+    def prefix_depth(self, prefix=()):
+        # Get the longest key length below the prefix that leads to a word
+        node = self.node(prefix)
+        return node.subtree_depth if node is not None else 0
+
+    def stress_histogram(self, prefix=()):
+        # Get the stress pattern histogram of the words whose key starts with the prefix (requires track_stress)
+        if not self.track_stress:
+            raise ValueError("Stress histograms are not tracked by this trie")
+        node = self.node(prefix)
+        return Counter(node.subtree_stress) if node is not None else Counter()
+
+    def kth(self, k, prefix=()):
+        # Get the (key, word) pair of the k-th word (0-based, in keys() order) whose key starts with the prefix
+        # Takes O(key length x branching) time: one root-to-word descent that scans the children of each node
+        # and skips whole subtrees by their word counts. The branching is bounded by the phoneme alphabet
+        # (~84 symbols with stress), so the cost does not grow with the number of words in the trie
+        node = self.node(prefix)
+        if node is None or not 0 <= k < node.subtree_words:
+            raise IndexError(k)
+        key = list(prefix)
+        while True:
+            if k < len(node.words):
+                return tuple(key), node.words[k]
+            k -= len(node.words)
+            for phoneme, child in node.children.items():
+                if k < child.subtree_words:
+                    key.append(phoneme)
+                    node = child
+                    break
+                k -= child.subtree_words
+
+    def sample(self, n=1, prefix=(), rng=random):
+        # Get n distinct (key, word) pairs chosen uniformly at random from the words whose key starts with the prefix
+        count = self.prefix_count(prefix)
+        return [self.kth(k, prefix) for k in rng.sample(range(count), min(n, count))]
+
 
 class Rhymer:
 
@@ -229,6 +325,66 @@ class Rhymer:
             return matches
         return []
 
+    def rhyme_class_table(self, match_stress=True):
+        # Map every word to a rhyme class id using the rhyme tails (last vowel to the end) in the end_rhyme_lookup trie
+        # Returns the word -> class id table and the list of rhyme tails indexed by class id
+        word_classes = {}
+        class_tails = []
+        class_ids = {}
+        for key, words in self.end_rhyme_lookup.keys():
+            tail = key if match_stress else tuple(re.sub(r'[0-9]+', '', phoneme) for phoneme in key)
+            if tail not in class_ids:
+                class_ids[tail] = len(class_tails)
+                class_tails.append(tail)
+            for word in words:
+                word_classes[word] = class_ids[tail]
+        return word_classes, class_tails
+
+    def count_pronunciations_starting_with(self, phonemes):
+        # Count the pronunciations that start with the specified phonemes (e.g. ('S', 'T', 'R'))
+        # Alternate pronunciations (e.g. READING(1)) are counted separately, so this counts pronunciations, not words
+        return self.start_lookup.prefix_count(tuple(phonemes))
+
+    def count_pronunciations_ending_with(self, phonemes):
+        # Count the pronunciations that end with the specified phonemes (e.g. ('IH0', 'NG'))
+        # Alternate pronunciations (e.g. READING(1)) are counted separately, so this counts pronunciations, not words
+        return self.end_lookup.prefix_count(tuple(phonemes)[::-1])
+
+    def sample_starting_with(self, phonemes, n=1, rng=random):
+        # Get n distinct random words (fewer only if the prefix runs out) with a pronunciation that starts with the
+        # specified phonemes
+        phonemes = tuple(phonemes)
+        return self._sample_words(self.start_lookup, phonemes,
+                                  lambda pronunciation: pronunciation[:len(phonemes)] == phonemes, n, rng)
+
+    def sample_ending_with(self, phonemes, n=1, rng=random):
+        # Get n distinct random words (fewer only if the suffix runs out) with a pronunciation that ends with the
+        # specified phonemes
+        phonemes = tuple(phonemes)
+        return self._sample_words(self.end_lookup, phonemes[::-1],
+                                  lambda pronunciation: pronunciation[len(pronunciation) - len(phonemes):] == phonemes,
+                                  n, rng)
+
+    def _sample_words(self, trie, prefix, matches, n, rng):
+        # Draw pronunciations below the prefix with kth() until n distinct base words are collected
+        # A word with m matching pronunciations is accepted with probability 1/m, so sampling is uniform over words
+        count = trie.prefix_count(prefix)
+        covered = 0  # Number of pronunciations below the prefix that belong to words already collected
+        words = []
+        seen = set()
+        while len(words) < n and covered < count:
+            entry = trie.kth(rng.randrange(count), prefix)[1]
+            word = _base_word(entry)
+            if word in seen:
+                continue
+            entries = {word, entry, *self.alternates(word)}
+            m = sum(1 for e in entries if e in self.dictionary and matches(self.dictionary[e]))
+            if rng.random() * m < 1:
+                seen.add(word)
+                words.append(word)
+                covered += m
+        return words
+
     def pronunciation(self, word):
         # Get the main pronunciation for the specified word
         word = word.upper()
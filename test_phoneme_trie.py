@@ -0,0 +1,171 @@
+import random
+from collections import Counter
+
+import pytest
+
+from rhymer import PhonemeTrie, Rhymer, stress_pattern
+
+PHONEMES = ['S', 'T', 'R', 'IH0', 'IH1', 'NG', 'AE1', 'K']
+
+# Small pronunciation dictionary with an alternate pronunciation (READING(1))
+DICTIONARY = """;;; test dictionary
+READING  R IY1 D IH0 NG
+READING(1)  R EH1 D IH0 NG
+SINGING  S IH1 NG IH0 NG
+STRING  S T R IH1 NG
+STRIKE  S T R AY1 K
+STREET  S T R IY1 T
+STRONG  S T R AO1 NG
+STRESS  S T R EH1 S
+STRESS(1)  S T R EH0 S
+STRESS(2)  S T R AH0 S
+CAT  K AE1 T
+"""
+PHONES = "AE\tvowel\nAH\tvowel\nAO\tvowel\nAY\tvowel\nEH\tvowel\nIH\tvowel\nIY\tvowel\nD\tstop\nK\tstop\nNG\tnasal\nR\tliquid\nS\tfricative\nT\tstop\n"
+
+
+def random_items(rng, n):
+    # Generate n random (key, word) pairs, some of them sharing keys
+    return [(tuple(rng.choice(PHONEMES) for _ in range(rng.randint(0, 5))), f"W{i}") for i in range(n)]
+
+
+def check_aggregates(node):
+    # Recompute the subtree aggregates of every node from scratch and compare them with the maintained ones
+    words = len(node.words)
+    depth = 0
+    for child in node.children.values():
+        child_words, child_depth = check_aggregates(child)
+        words += child_words
+        if child_words:
+            depth = max(depth, child_depth + 1)
+    assert node.subtree_words == words
+    assert node.subtree_depth == depth
+    return words, depth
+
+
+def flatten(trie, prefix=()):
+    # List the (key, word) pairs below the prefix in keys() order
+    node = trie.node(prefix)
+    if node is None:
+        return []
+    return [(key, word) for key, words in node.keys(list(prefix)) for word in words]
+
+
+def stress_counts(trie, prefix=()):
+    # Count the stress patterns of the words in the trie by walking it
+    return Counter(stress_pattern(key) for key, _ in flatten(trie, prefix))
+
+
+@pytest.fixture
+def rhymer(tmp_path):
+    # Build a Rhymer from the small test dictionary
+    dictionary_path = tmp_path / "dict"
+    phones_path = tmp_path / "phones"
+    dictionary_path.write_text(DICTIONARY)
+    phones_path.write_text(PHONES)
+    return Rhymer(str(dictionary_path), str(phones_path))
+
+
+def test_aggregates_after_set_delete_add_and_sub():
+    rng = random.Random(0)
+    items = random_items(rng, 400)
+    trie = PhonemeTrie(track_stress=True)
+    for key, word in items:
+        trie[key] = word
+    check_aggregates(trie)
+    assert len(trie) == 400
+    assert trie.stress_histogram() == stress_counts(trie)
+
+    other = PhonemeTrie()
+    for key, word in items[:150]:
+        other[key] = word
+    trie -= other
+    check_aggregates(trie)
+    assert len(trie) == 250
+    assert trie.stress_histogram() == stress_counts(trie)
+
+    trie += other
+    check_aggregates(trie)
+    assert len(trie) == 400
+
+    for key, word in items[150:300]:
+        trie.__delitem__(key, word)
+    check_aggregates(trie)
+    assert len(trie) == 250
+    assert trie.stress_histogram() == stress_counts(trie)
+
+
+def test_depth_shrinks_when_the_deepest_word_is_deleted():
+    trie = PhonemeTrie()
+    trie[('S', 'T', 'R')] = 'STR'
+    trie[('S',)] = 'S'
+    assert trie.prefix_depth() == 3
+    trie.__delitem__(('S', 'T', 'R'), 'STR')
+    assert trie.prefix_depth() == 1
+    assert trie.prefix_depth(('S', 'T')) == 0
+
+
+def test_prefix_count():
+    rng = random.Random(1)
+    trie = PhonemeTrie()
+    for key, word in random_items(rng, 300):
+        trie[key] = word
+    for prefix in [(), ('S',), ('S', 'T'), ('IH0', 'NG'), ('K', 'K', 'K', 'K', 'K', 'K')]:
+        assert trie.prefix_count(prefix) == len(flatten(trie, prefix))
+
+
+def test_kth_matches_keys_order():
+    rng = random.Random(2)
+    trie = PhonemeTrie()
+    for key, word in random_items(rng, 300):
+        trie[key] = word
+    for prefix in [(), ('T',), ('R', 'IH1')]:
+        assert [trie.kth(k, prefix) for k in range(trie.prefix_count(prefix))] == flatten(trie, prefix)
+    with pytest.raises(IndexError):
+        trie.kth(len(trie))
+    with pytest.raises(IndexError):
+        trie.kth(0, ('NOT', 'A', 'PHONEME'))
+
+
+def test_sample():
+    rng = random.Random(3)
+    trie = PhonemeTrie()
+    for key, word in random_items(rng, 300):
+        trie[key] = word
+    sample = trie.sample(20, ('S',), random.Random(4))
+    assert len(sample) == len(set(sample)) == 20
+    assert all(key[0] == 'S' for key, _ in sample)
+    assert sorted(trie.sample(10 ** 6, ('S',), rng)) == sorted(flatten(trie, ('S',)))
+
+
+def test_stress_histogram_requires_tracking():
+    with pytest.raises(ValueError):
+        PhonemeTrie().stress_histogram()
+
+
+def test_rhymer_counts_pronunciations(rhymer):
+    assert rhymer.count_pronunciations_ending_with(('IH0', 'NG')) == 3  # READING, READING(1) and SINGING
+    assert rhymer.count_pronunciations_starting_with(('S', 'T', 'R')) == 7  # Including STRESS(1) and STRESS(2)
+    assert rhymer.count_pronunciations_starting_with(('Z',)) == 0
+
+
+def test_rhymer_samples_strip_alternate_suffixes(rhymer):
+    assert sorted(rhymer.sample_ending_with(('IH0', 'NG'), 10)) == ['READING', 'SINGING']
+    assert sorted(rhymer.sample_starting_with(('S', 'T', 'R'), 10)) == ['STREET', 'STRESS', 'STRIKE', 'STRING',
+                                                                        'STRONG']
+    assert rhymer.sample_starting_with(('Z',), 10) == []
+
+
+def test_rhymer_samples_exactly_n_distinct_words(rhymer):
+    rng = random.Random(5)
+    for _ in range(200):
+        words = rhymer.sample_starting_with(('S', 'T', 'R'), 4, rng)
+        assert len(words) == len(set(words)) == 4
+
+
+def test_rhymer_samples_uniformly_over_words(rhymer):
+    # STRESS has 3 pronunciations below the prefix but must not be drawn more often than the other words
+    rng = random.Random(6)
+    counts = Counter(rhymer.sample_starting_with(('S', 'T', 'R'), 1, rng)[0] for _ in range(5000))
+    assert set(counts) == {'STREET', 'STRESS', 'STRIKE', 'STRING', 'STRONG'}
+    assert all(850 < count < 1150 for count in counts.values())
@@ -0,0 +1,88 @@
+import random
+from collections import Counter
+
+from rhyme_scheme import (MAX_STANZA_LINES, UNKNOWN, analyze_files, analyze_lines, empty_result, line_end_words,
+                          merge_results, rhyme_schemes, scheme_label, scheme_letter, stanzas)
+
+# Small rhyme class table standing in for Rhymer.rhyme_class_table()
+WORD_CLASSES = {'CAT': 0, 'MAT': 0, 'SKY': 1, 'HIGH': 1, 'RED': 2, 'BED': 2, 'BLUE': 3, 'YOU': 3, "SINGIN'": 4}
+POEM = ["The cat sat on the mat\n", "I saw a big fat cat.\n", "The sun is in the sky\n", "and birds fly high\n",
+        "\n",
+        "Roses are red\n", "violets are blue\n", "in my bed\n", "I think of you\n"]
+
+
+def test_line_end_words():
+    assert list(line_end_words(["Roses are red,\n", "  \n", "...\n", "singin'\n"])) == ['RED', None, '', "SINGIN'"]
+
+
+def test_scheme_letter():
+    assert [scheme_letter(i) for i in (0, 1, 25, 26, 27)] == ['A', 'B', 'Z', 'AA', 'AB']
+
+
+def test_scheme_label():
+    assert scheme_label([7, 3, 7, 3]) == 'ABAB'
+    assert scheme_label([3, 3, 7, 7]) == 'AABB'
+    assert scheme_label([3, UNKNOWN, 3, 5]) == 'A?AB'
+
+
+def test_stanzas_split_on_breaks():
+    assert list(stanzas([1, 2, None, None, 3, None])) == [([1, 2], False), ([3], False)]
+
+
+def test_stanzas_split_long_stanzas_into_continued_windows():
+    chunks = list(stanzas([1] * 11 + [None] + [2] * 6, max_lines=6, window=4))
+    assert chunks == [([1] * 4, False), ([1] * 4, True), ([1] * 3, True), ([2] * 6, False)]
+
+
+def test_rhyme_schemes():
+    assert list(rhyme_schemes(POEM, WORD_CLASSES)) == ['AABB', 'ABAB']
+
+
+def test_analyze_lines():
+    result = analyze_lines(POEM + ["\n", "zzyzx qwerty\n"], WORD_CLASSES)
+    assert result['lines'] == 9
+    assert result['stanzas'] == 3
+    assert result['unknown'] == 1
+    assert result['schemes'] == Counter({'AABB': 1, 'ABAB': 1, '?': 1})
+    assert result['families'] == Counter({0: 2, 1: 2, 2: 2, 3: 2})
+
+
+def test_long_stanzas_are_labelled_in_windows():
+    words = ['cat', 'mat', 'sky', 'high', 'red', 'blue', 'bed', 'you']
+    lines = [f"line ending in {words[i % len(words)]}\n" for i in range(64002)]
+    result = analyze_lines(lines, WORD_CLASSES)
+    assert result['lines'] == 64002
+    assert result['stanzas'] == 1
+    assert result['schemes'] == Counter({'AABB': 8000, 'ABAB': 8000})  # The trailing 2 lines are not labelled
+
+
+def test_scheme_counts_stay_bounded():
+    rng = random.Random(0)
+    lines = []
+    for _ in range(2000):
+        lines.extend(f"end {rng.choice(list(WORD_CLASSES))}\n" for _ in range(rng.randint(1, 12)))
+        lines.append("\n")
+    result = analyze_lines(lines, WORD_CLASSES)
+    assert result['stanzas'] == 2000
+    assert all(len(scheme) <= MAX_STANZA_LINES for scheme in result['schemes'])
+
+
+def test_merge_results():
+    first = analyze_lines(POEM, WORD_CLASSES)
+    second = analyze_lines(POEM[:4], WORD_CLASSES)
+    merged = merge_results([first, second, empty_result()])
+    assert merged['lines'] == 12
+    assert merged['stanzas'] == 3
+    assert merged['schemes'] == Counter({'AABB': 2, 'ABAB': 1})
+    assert merged['families'][0] == 4
+
+
+def test_analyze_files_matches_in_process_results(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"shard_{i}.txt"
+        path.write_text(''.join(POEM))
+        paths.append(str(path))
+    expected = merge_results(analyze_lines(POEM, WORD_CLASSES) for _ in paths)
+    assert analyze_files(paths, WORD_CLASSES, processes=1) == expected
+    assert analyze_files(paths, WORD_CLASSES, processes=2) == expected